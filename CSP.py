@@ -1,363 +1,654 @@
-import random
-from copy import deepcopy, copy
-from typing import Set, Dict, List, TypeVar, Optional
-from abc import ABC, abstractmethod
-
-from util import monitor
-
-Value = TypeVar('Value')
-
-class Variable(ABC):
-    @property
-    @abstractmethod
-    def startDomain(self) -> Set[Value]:
-        """ Returns the set of initial values of this variable (not taking constraints into account). """
-        pass
-
-class CSP(ABC):
-    def __init__(self, MRV=True, LCV=True):
-        """
-        MRV: Minimum Remaining Values (Most constrained variable) -> Used when choosing next unassigned variable
-        LCV: Least Constricted Value -> Used when choosing value
-        """
-        self.MRV = MRV
-        self.LCV = LCV
-
-    @property
-    @abstractmethod
-    def variables(self) -> Set[Variable]:
-        """ Return the set of variables in this CSP.
-            Abstract method to be implemented for specific instances of CSP problems.
-        """
-        pass
-
-    def remainingVariables(self, assignment: Dict[Variable, Value]) -> Set[Variable]:
-        """ Returns the variables not yet assigned. """
-        return self.variables.difference(assignment.keys())
-
-    @abstractmethod
-    def neighbors(self, var: Variable) -> Set[Variable]:
-        """ Return all variables related to var by some constraint.
-            Abstract method to be implemented for specific instances of CSP problems.
-        """
-        pass
-
-    def assignmentToStr(self, assignment: Dict[Variable, Value]) -> str:
-        """ Formats the assignment of variables for this CSP into a string. """
-        s = ""
-        for var, val in assignment.items():
-            s += f"{var} = {val}\n"
-        return s
-
-    def isComplete(self, assignment: Dict[Variable, Value]) -> bool:
-        """ Return whether the assignment covers all variables.
-            :param assignment: dict (Variable -> value)
-        """
-        # TODO: Implement CSP::isComplete (problem 1)
-
-        if self.isValid(assignment) and len(self.remainingVariables(assignment)) == 0:
-            return True
-
-        return False
-
-    @abstractmethod
-    def isValidPairwise(self, var1: Variable, val1: Value, var2: Variable, val2: Value) -> bool:
-        """ Return whether this pairwise assignment is valid with the constraints of the csp.
-            Abstract method to be implemented for specific instances of CSP problems.
-        """
-        pass
-
-    def isValid(self, assignment: Dict[Variable, Value]) -> bool:
-        """ Return whether the assignment is valid (i.e. is not in conflict with any constraints).
-            You only need to take binary constraints into account.
-            Hint: use `CSP::neighbors` and `CSP::isValidPairwise` to check that all binary constraints are satisfied.
-            Note that constraints are symmetrical, so you don't need to check them in both directions.
-        """
-
-        assignedVariables = assignment.keys()
-
-        for var in assignedVariables:
-            neighbours = self.neighbors(var)
-
-            # Filter out unassigned neighbour variables
-            neighbours = [neighbour for neighbour in neighbours if neighbour in assignedVariables]
-            # TODO don't check in both directions
-            for neighbour in neighbours:
-                if not self.isValidPairwise(var, assignment[var], neighbour, assignment[neighbour]):
-                    return False
-
-        return True
-
-    def solveBruteForce(self, initialAssignment: Dict[Variable, Value] = dict()) -> Optional[Dict[Variable, Value]]:
-        """ Called to solve this CSP with brute force technique.
-            Initializes the domains and calls `CSP::_solveBruteForce`. """
-        initialAssignment = deepcopy(initialAssignment)
-        domains = domainsFromAssignment(initialAssignment, self.variables)
-        return self._solveBruteForce(initialAssignment, domains)
-
-    # Count the amounts of calls: can be used to answer a question from the assigment
-    @monitor
-    def _solveBruteForce(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]]) -> Optional[
-        Dict[Variable, Value]]:
-        """ Implement the actual backtracking algorithm to brute force this CSP.
-            Use `CSP::isComplete`, `CSP::isValid`, `CSP::selectVariable` and `CSP::orderDomain`.
-            :return: a complete and valid assignment if one exists, None otherwise.
-        """
-
-        # TODO: question, is this function called somewhere else where arc consistency is used for example
-        #  (when having to backtrack)
-        # TODO: Implement CSP::_solveBruteForce (problem 1)
-        # TODO maybe remove duplicate code
-
-        if self.isComplete(assignment):
-            return assignment
-        else:
-            var = self.selectVariable(assignment, domains)
-
-            for value in self.orderDomain(assignment, domains, var):
-                assignment[var] = value
-                prev_domain = domains.pop(var)
-
-                if self.isValid(assignment):
-                    result = self._solveBruteForce(assignment, domains)
-                    if result is not None:
-                        return result
-
-                assignment.pop(var)
-                domains[var] = prev_domain
-
-            self.isValid(assignment)
-            return None
-
-    def solveForwardChecking(self, initialAssignment: Dict[Variable, Value] = dict()) -> Optional[
-        Dict[Variable, Value]]:
-        """ Called to solve this CSP with forward checking.
-            Initializes the domains and calls `CSP::_solveForwardChecking`. """
-        initialAssignment = deepcopy(initialAssignment)
-        domains = domainsFromAssignment(initialAssignment, self.variables)
-        domains, nr_pruned = self.forwardChecking(initialAssignment, domains)
-        return self._solveForwardChecking(initialAssignment, domains)
-
-    @monitor
-    def _solveForwardChecking(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]]) -> Optional[
-        Dict[Variable, Value]]:
-        """ Implement the actual backtracking algorithm with forward checking.
-            Use `CSP::forwardChecking` and you should no longer need to check if an assignment is valid.
-            :return: a complete and valid assignment if one exists, None otherwise.
-        """
-
-        if self.isComplete(assignment):
-            return assignment
-        else:
-            var = self.selectVariable(assignment, domains)
-
-            for value in self.orderDomain(assignment, domains, var):
-                assignment[var] = value
-                prev_domain = domains.pop(var)
-
-                pruned_domains, nr_pruned = self.forwardChecking(assignment, domains, var)
-
-                valid = True
-                for pruned_domain in pruned_domains.values():
-                    if len(pruned_domain) == 0:
-                        valid = False
-
-                if valid:
-                    result = self._solveForwardChecking(assignment, pruned_domains)
-
-                    if result is not None:
-                        return result
-
-                assignment.pop(var)
-                domains[var] = prev_domain
-
-            return None
-
-    def forwardChecking(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]],
-                        variable: Optional[Variable] = None) -> (Dict[Variable, Set[Value]], Value):
-
-        # Differences noticed: less calls often necessary, although domains still randomly ordered so may take lots of calls.
-        # Calls are faster due to checking whether an assignment is valid or not happens faster (pruned)
-
-        """ Implement the forward checking algorithm from the theory lectures.
-
-        :param domains: current domains.
-        :param assignment: current assignment.
-        :param variable: If not None, the variable that was just assigned (only need to check changes).
-        :return: the new domains after enforcing all constraints and the numbers of elements pruned from the domain.
-        """
-
-        # Necessary: isValidPairwise -> given current assignment to variable, check domains of all other variables
-
-        domains = copy(domains)
-        nr_pruned = 0
-
-        adjusted_assignment = assignment if variable is None else {variable: assignment[variable]}
-
-        for assigned_var, assigned_value in adjusted_assignment.items():
-
-            for unassigned_var, domain in domains.items():
-                elems_to_remove = set()
-                for elem in domain:
-                    if not self.isValidPairwise(assigned_var, assigned_value, unassigned_var, elem):
-                        elems_to_remove.add(elem)
-                        nr_pruned += 1
-
-                domains[unassigned_var] = domain.difference(elems_to_remove)
-
-                if len(domain) == 0:
-                    return domains, nr_pruned
-
-        return domains, nr_pruned
-
-    def selectVariable(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]]) -> Variable:
-        """ Implement a strategy to select the next variable to assign. """
-        if not self.MRV:
-            return random.choice(list(self.remainingVariables(assignment)))
-
-        domain_lengths = {var: len(domain) for var, domain in domains.items()}
-        min_domain_length = min(domain_lengths.values())
-
-        for current_var, current_domain_length in domain_lengths.items():
-            if current_domain_length == min_domain_length:
-                return current_var
-
-    def orderDomain(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]], var: Variable) -> \
-            List[Value]:
-        """ Implement a smart ordering of the domain values. """
-        if not self.LCV:
-            return list(domains[var])
-
-        domain_to_order = domains.pop(var)
-
-        value_nr_pruned_dict = dict()
-
-        for val in domain_to_order:
-            current_assignment = copy(assignment)
-            current_assignment[var] = val
-
-            pruned_domains, nr_pruned = self.forwardChecking(current_assignment, domains, var)
-
-            # LCV only works properly if the pruned domains do not contain empty sets
-            contains_empty_domain = False
-            for pruned_var, pruned_domain in pruned_domains.items():
-                if len(pruned_domain) == 0:
-                    contains_empty_domain = True
-
-            if not contains_empty_domain:
-                value_nr_pruned_dict[val] = nr_pruned
-
-        ordered_value_nr_pruned_dict = dict(
-            sorted(value_nr_pruned_dict.items(), key=lambda item: item[1], reverse=False))
-        ordered_domain = list(ordered_value_nr_pruned_dict.keys())
-
-        # Reset domain
-        domains[var] = domain_to_order
-
-        return ordered_domain
-
-    def solveAC3(self, initialAssignment: Dict[Variable, Value] = dict()) -> Optional[Dict[Variable, Value]]:
-        """ Called to solve this CSP with AC3.
-            Initializes domains and calls `CSP::_solveAC3`. """
-        initialAssignment = deepcopy(initialAssignment)
-        domains = domainsFromAssignment(initialAssignment, self.variables)
-        domains = self.ac3(initialAssignment, domains)
-        return self._solveAC3(initialAssignment, domains)
-
-    @monitor
-    def _solveAC3(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]]) -> Optional[
-        Dict[Variable, Value]]:
-        """
-            Implement the actual backtracking algorithm with AC3.
-            Use `CSP::ac3`.
-            :return: a complete and valid assignment if one exists, None otherwise.
-        """
-        if self.isComplete(assignment):
-            return assignment
-        else:
-            # Why is min(domain_lengths) an empty set?
-            var = self.selectVariable(assignment, domains)
-
-            for value in self.orderDomain(assignment, domains, var):
-                assignment[var] = value
-                prev_domain = domains.pop(var)
-
-                new_domains, nr_pruned = self.forwardChecking(assignment, domains, var)
-                new_domains = self.ac3(assignment, new_domains, var)
-
-                # Backtrack required
-                if new_domains is not None:
-                    result = self._solveAC3(assignment, new_domains)
-
-                    if result is not None:
-                        return result
-
-                assignment.pop(var)
-                domains[var] = prev_domain
-
-            return None
-
-    def ac3(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]],
-            variable: Optional[Variable] = None) -> Dict[Variable, Set[Value]] or None:
-        """ Implement the AC3 algorithm from the theory lectures.
-
-        :param domains: current domains.
-        :param assignment: current assignment.
-        :param variable: If not None, the variable that was just assigned (only need to check changes).
-        :return: the new domains ensuring arc consistency or none in case a domain was made empty (backtrack required)
-        """
-
-        domains = copy(domains)
-        unassigned_variables = self.remainingVariables(assignment)
-
-        queue = []
-
-        for var1 in unassigned_variables:
-            for var2 in unassigned_variables:
-                if var1 == var2:
-                    continue
-
-                queue.append((var1, var2))
-
-        while len(queue) > 0:
-            tail_var, head_var = queue.pop(0)
-
-            if self.removeInconsistentValues(domains, tail_var, head_var):
-
-                for neighbour in self.neighbors(tail_var):
-                    if neighbour in assignment:
-                        continue
-                    new_arc = (neighbour, tail_var)
-                    if new_arc not in queue:
-                        queue.append(new_arc)
-
-            if len(domains[tail_var]) == 0:
-                return None
-
-        return domains
-
-    def removeInconsistentValues(self, domains: Dict[Variable, Set[Value]], var1, var2) -> bool:
-
-        adjusted_domain_var1 = copy(domains[var1])
-
-        for val_var1 in domains[var1]:
-            constraintSatisfied = False
-            for val_var2 in domains[var2]:
-                if self.isValidPairwise(var1, val_var1, var2, val_var2):
-                    constraintSatisfied = True
-                    break
-
-            if not constraintSatisfied:
-                adjusted_domain_var1.remove(val_var1)
-
-        if adjusted_domain_var1 != domains[var1]:
-            domains[var1] = adjusted_domain_var1
-            return True
-
-        return False
-
-def domainsFromAssignment(assignment: Dict[Variable, Value], variables: Set[Variable]) -> Dict[Variable, Set[Value]]:
-    """ Fills in the initial domains for each variable.
-    """
-    domains = {v: v.startDomain for v in variables if v not in assignment}
-    return domains
+import heapq
+import multiprocessing
+import random
+from collections import deque
+from copy import deepcopy, copy
+from typing import Set, FrozenSet, Dict, List, TypeVar, Optional, Iterator
+from abc import ABC, abstractmethod
+
+from util import tick
+
+Value = TypeVar('Value')
+
+class Variable(ABC):
+    # No instance dict of its own, so subclasses can opt into __slots__
+    __slots__ = ()
+
+    @property
+    @abstractmethod
+    def startDomain(self) -> Set[Value]:
+        """ Returns the set of initial values of this variable (not taking constraints into account). """
+        pass
+
+class CSP(ABC):
+    def __init__(self, MRV=True, LCV=True):
+        """
+        MRV: Minimum Remaining Values (Most constrained variable) -> Used when choosing next unassigned variable
+        LCV: Least Constricted Value -> Used when choosing value
+        """
+        self.MRV = MRV
+        self.LCV = LCV
+
+        self._neighbor_cache: Dict[Variable, FrozenSet[Variable]] = {}
+        self._nvars: Optional[int] = None
+        self._variables_cache: Optional[FrozenSet[Variable]] = None
+        self._variables_list: Optional[List[Variable]] = None
+
+        # Domains are represented as int bitmasks: bit i set means the value
+        # `self._value_list[i]` is still in the domain. The index is built lazily
+        # from the union of all start domains.
+        self._value_list: Optional[List[Value]] = None
+        self._value_bit: Optional[Dict[Value, int]] = None
+        self._start_masks: Optional[Dict[Variable, int]] = None
+        self._compat_cache: Dict = {}
+        self._pruner_table: Optional[Dict[Variable, Dict[Value, List]]] = None
+
+    @property
+    @abstractmethod
+    def variables(self) -> Set[Variable]:
+        """ Return the set of variables in this CSP.
+            Abstract method to be implemented for specific instances of CSP problems.
+        """
+        pass
+
+    def _allVariables(self) -> FrozenSet[Variable]:
+        """ Returns the variable set, cached on first access: the variables of a CSP
+            are invariant over a solve, so `CSP::variables` need not be re-queried. """
+        if self._variables_cache is None:
+            self._variables_cache = frozenset(self.variables)
+            self._variables_list = list(self._variables_cache)
+            self._nvars = len(self._variables_cache)
+        return self._variables_cache
+
+    def remainingVariables(self, assignment: Dict[Variable, Value]) -> Set[Variable]:
+        """ Returns the variables not yet assigned. """
+        return self._allVariables().difference(assignment.keys())
+
+    def _buildValueIndex(self) -> None:
+        """ Assigns a bit position to every value occurring in some start domain,
+            so that domains can be manipulated as int bitmasks. """
+        self._value_list = []
+        self._value_bit = {}
+        self._start_masks = {}
+
+        for var in self._allVariables():
+            mask = 0
+            for val in var.startDomain:
+                bit = self._value_bit.get(val)
+                if bit is None:
+                    bit = len(self._value_list)
+                    self._value_bit[val] = bit
+                    self._value_list.append(val)
+                mask |= 1 << bit
+            self._start_masks[var] = mask
+
+    def domainsFromAssignment(self, assignment: Dict[Variable, Value]) -> Dict[Variable, int]:
+        """ Fills in the initial domains (as bitmasks) for each unassigned variable. """
+        if self._start_masks is None:
+            self._buildValueIndex()
+        return {v: self._start_masks[v] for v in self._allVariables() if v not in assignment}
+
+    def _iterMask(self, mask: int):
+        """ Yields the values whose bits are set in the given domain mask. """
+        while mask:
+            low_bit = mask & -mask
+            mask ^= low_bit
+            yield self._value_list[low_bit.bit_length() - 1]
+
+    def _compatMask(self, var1: Variable, val1: Value, var2: Variable) -> int:
+        """ Returns the bitmask of var2's start-domain values compatible with var1 = val1.
+            The constraints are static for a given CSP, so the mask is computed once per
+            (var1, val1, var2) triple and cached; pruning then reduces to a single AND. """
+        key = (var1, val1, var2)
+        mask = self._compat_cache.get(key)
+        if mask is None:
+            if self._start_masks is None:
+                self._buildValueIndex()
+            mask = 0
+            for val2 in self._iterMask(self._start_masks[var2]):
+                if self.isValidPairwise(var1, val1, var2, val2):
+                    mask |= 1 << self._value_bit[val2]
+            self._compat_cache[key] = mask
+        return mask
+
+    def _specialize(self) -> None:
+        """ Specializes the solver for this concrete CSP by materializing, for every
+            possible assignment var = val, the ready-made [(neighbour, compat_mask), ...]
+            pruner list. The constraint graph and constraints are fixed before solving,
+            so this partial evaluation lets the hot loops run on prebuilt tables with
+            no cache probes or dispatch left in them. """
+        if self._pruner_table is not None:
+            return
+        if self._start_masks is None:
+            self._buildValueIndex()
+
+        self._pruner_table = {
+            var: {val: [(neighbour, self._compatMask(var, val, neighbour))
+                        for neighbour in self.neighbors(var)]
+                  for val in self._iterMask(self._start_masks[var])}
+            for var in self._allVariables()
+        }
+
+    def neighbors(self, var: Variable) -> FrozenSet[Variable]:
+        """ Return all variables related to var by some constraint.
+            The constraint graph is static for a given CSP, so the result of
+            `CSP::_computeNeighbors` is cached on first access.
+        """
+        neighbours = self._neighbor_cache.get(var)
+        if neighbours is None:
+            neighbours = frozenset(self._computeNeighbors(var))
+            self._neighbor_cache[var] = neighbours
+        return neighbours
+
+    @abstractmethod
+    def _computeNeighbors(self, var: Variable) -> Set[Variable]:
+        """ Return all variables related to var by some constraint.
+            Abstract method to be implemented for specific instances of CSP problems.
+        """
+        pass
+
+    def assignmentToStr(self, assignment: Dict[Variable, Value]) -> str:
+        """ Formats the assignment of variables for this CSP into a string. """
+        s = ""
+        for var, val in assignment.items():
+            s += f"{var} = {val}\n"
+        return s
+
+    def isComplete(self, assignment: Dict[Variable, Value]) -> bool:
+        """ Return whether the assignment covers all variables.
+            The solvers only ever extend consistent assignments, so completion is
+            purely a count check.
+            :param assignment: dict (Variable -> value)
+        """
+        if self._nvars is None:
+            self._allVariables()
+        return len(assignment) == self._nvars
+
+    @abstractmethod
+    def isValidPairwise(self, var1: Variable, val1: Value, var2: Variable, val2: Value) -> bool:
+        """ Return whether this pairwise assignment is valid with the constraints of the csp.
+            Abstract method to be implemented for specific instances of CSP problems.
+        """
+        pass
+
+    def isValid(self, assignment: Dict[Variable, Value], last_var: Optional[Variable] = None) -> bool:
+        """ Return whether the assignment is valid (i.e. is not in conflict with any constraints).
+            You only need to take binary constraints into account.
+            :param last_var: If not None, the variable that was just assigned. Since the rest of
+                the assignment was already valid before, only the constraints involving this
+                variable need to be checked.
+        """
+
+        if last_var is not None:
+            last_val = assignment[last_var]
+            for neighbour in self.neighbors(last_var):
+                if neighbour in assignment and \
+                        not self.isValidPairwise(last_var, last_val, neighbour, assignment[neighbour]):
+                    return False
+            return True
+
+        for var, val in assignment.items():
+            for neighbour in self.neighbors(var):
+                if neighbour in assignment and \
+                        not self.isValidPairwise(var, val, neighbour, assignment[neighbour]):
+                    return False
+
+        return True
+
+    def solveBruteForce(self, initialAssignment: Dict[Variable, Value] = dict()) -> Optional[Dict[Variable, Value]]:
+        """ Called to solve this CSP with brute force technique.
+            Initializes the domains and calls `CSP::_solveBruteForce`. """
+        initialAssignment = deepcopy(initialAssignment)
+        # The givens are the one part of the assignment the solver never checks
+        # itself, so reject a conflicting initial assignment up front
+        if not self.isValid(initialAssignment):
+            return None
+        domains = self.domainsFromAssignment(initialAssignment)
+        return self._solveBruteForce(initialAssignment, domains)
+
+    def _solveBruteForce(self, assignment: Dict[Variable, Value], domains: Dict[Variable, int]) -> Optional[
+        Dict[Variable, Value]]:
+        """ Implement the actual backtracking algorithm to brute force this CSP.
+            Uses an explicit stack of (variable, value-iterator, saved domain) frames
+            instead of recursion, so deep searches pay neither Python call overhead
+            nor the recursion limit. The node counter (`util::tick`) is bumped once
+            per expanded node, matching the call counts of the recursive version.
+            :return: a complete and valid assignment if one exists, None otherwise.
+        """
+
+        # Count the expanded nodes: can be used to answer a question from the assigment
+        tick('_solveBruteForce')
+
+        if self.isComplete(assignment):
+            return assignment
+
+        var = self.selectVariable(assignment, domains)
+        values = iter(self.orderDomain(assignment, domains, var))
+        stack = [(var, values, domains.pop(var))]
+
+        while stack:
+            var, values, prev_domain = stack[-1]
+
+            for value in values:
+                assignment[var] = value
+
+                if self.isValid(assignment, last_var=var):
+                    tick('_solveBruteForce')
+
+                    if self.isComplete(assignment):
+                        return assignment
+
+                    next_var = self.selectVariable(assignment, domains)
+                    next_values = iter(self.orderDomain(assignment, domains, next_var))
+                    stack.append((next_var, next_values, domains.pop(next_var)))
+                    break
+            else:
+                # Domain exhausted: undo this frame and backtrack
+                assignment.pop(var, None)
+                domains[var] = prev_domain
+                stack.pop()
+
+        return None
+
+    def solveBruteForceParallel(self, n_workers: int = 4,
+                                initialAssignment: Dict[Variable, Value] = dict()) -> Optional[
+        Dict[Variable, Value]]:
+        """ Portfolio parallelism for `CSP::solveBruteForce`: runs independently seeded
+            solvers in separate processes (sidestepping the GIL) and returns the first
+            solution found, killing the losing workers. Only pays off when variable
+            selection involves randomness (MRV disabled), so the workers explore
+            different subtrees.
+        """
+        pool = multiprocessing.Pool(processes=n_workers)
+        try:
+            args = [(self, seed, initialAssignment) for seed in range(n_workers)]
+            for result in pool.imap_unordered(_solveBruteForceSeeded, args):
+                if result is not None:
+                    return result
+            return None
+        finally:
+            # terminate, not close: the losing workers would otherwise keep
+            # searching to completion with the answer already in hand
+            pool.terminate()
+            pool.join()
+
+    def solveForwardChecking(self, initialAssignment: Dict[Variable, Value] = dict()) -> Optional[
+        Dict[Variable, Value]]:
+        """ Called to solve this CSP with forward checking.
+            Initializes the domains and calls `CSP::_solveForwardChecking`. """
+        initialAssignment = deepcopy(initialAssignment)
+        if not self.isValid(initialAssignment):
+            return None
+        domains = self.domainsFromAssignment(initialAssignment)
+        domains, nr_pruned = self.forwardChecking(initialAssignment, domains)
+        return self._solveForwardChecking(initialAssignment, domains)
+
+    def _solveForwardChecking(self, assignment: Dict[Variable, Value], domains: Dict[Variable, int]) -> Optional[
+        Dict[Variable, Value]]:
+        """ Implement the actual backtracking algorithm with forward checking.
+            Iterative like `CSP::_solveBruteForce`, but with a single shared domains
+            dict: pruning happens in place and is undone through a trail of
+            (variable, removed_mask) entries, so no per-node dict copies are made.
+            Thanks to `CSP::forwardChecking` no validity check is needed on assignments.
+            :return: a complete and valid assignment if one exists, None otherwise.
+        """
+
+        tick('_solveForwardChecking')
+
+        if self.isComplete(assignment):
+            return assignment
+
+        trail = []
+
+        var = self.selectVariable(assignment, domains)
+        values = iter(self.orderDomain(assignment, domains, var))
+        stack = [(var, values, domains.pop(var), len(trail))]
+
+        while stack:
+            var, values, prev_domain, mark = stack[-1]
+
+            for value in values:
+                # Undo the pruning done for the previous value tried at this level
+                self._undoTrail(domains, trail, mark)
+
+                assignment[var] = value
+                self.forwardChecking(assignment, domains, var, trail=trail)
+
+                # An empty (zero) domain mask means a dead end
+                if all(domains.values()) and self.propagateSingletons(domains, trail=trail):
+                    tick('_solveForwardChecking')
+
+                    if self.isComplete(assignment):
+                        return assignment
+
+                    next_var = self.selectVariable(assignment, domains)
+                    next_values = iter(self.orderDomain(assignment, domains, next_var))
+                    stack.append((next_var, next_values, domains.pop(next_var), len(trail)))
+                    break
+            else:
+                # Domain exhausted: undo this frame and backtrack
+                self._undoTrail(domains, trail, mark)
+                assignment.pop(var, None)
+                domains[var] = prev_domain
+                stack.pop()
+
+        return None
+
+    def forwardChecking(self, assignment: Dict[Variable, Value], domains: Dict[Variable, int],
+                        variable: Optional[Variable] = None,
+                        trail: Optional[List] = None) -> (Dict[Variable, int], int):
+
+        # Differences noticed: less calls often necessary, although domains still randomly ordered so may take lots of calls.
+        # Calls are faster due to checking whether an assignment is valid or not happens faster (pruned)
+
+        """ Implement the forward checking algorithm from the theory lectures.
+
+        :param domains: current domains (as bitmasks).
+        :param assignment: current assignment.
+        :param variable: If not None, the variable that was just assigned (only need to check changes).
+        :param trail: If not None, domains is pruned in place and every removal is logged
+            on the trail as (variable, removed_mask) so the caller can undo it with
+            `CSP::_undoTrail`; otherwise a pruned copy of domains is returned.
+        :return: the new domains after enforcing all constraints and the numbers of elements pruned from the domain.
+        """
+
+        if trail is None:
+            domains = copy(domains)
+        nr_pruned = 0
+
+        if self._pruner_table is None:
+            self._specialize()
+        pruner_table = self._pruner_table
+
+        adjusted_assignment = assignment if variable is None else {variable: assignment[variable]}
+
+        for assigned_var, assigned_value in adjusted_assignment.items():
+
+            # Only neighbours of the assigned variable can lose values: isValidPairwise
+            # trivially holds for unconstrained pairs
+            for unassigned_var, compat_mask in pruner_table[assigned_var][assigned_value]:
+                domain = domains.get(unassigned_var)
+                if domain is None:
+                    continue
+
+                new_domain = domain & compat_mask
+
+                if new_domain != domain:
+                    domains[unassigned_var] = new_domain
+                    if trail is not None:
+                        trail.append((unassigned_var, domain ^ new_domain))
+                    nr_pruned += (domain ^ new_domain).bit_count()
+
+                    # Domain wipeout: this branch is a dead end, no point pruning further
+                    if not new_domain:
+                        return domains, nr_pruned
+
+        return domains, nr_pruned
+
+    def propagateSingletons(self, domains: Dict[Variable, int], trail: Optional[List] = None) -> bool:
+        """ Singleton elimination: when an unassigned variable's domain has shrunk to a
+            single value, every solution below this node must use that value, so its
+            neighbours' domains can be pruned against it right away. Runs a worklist to
+            fixpoint, queueing neighbours that become singletons in turn.
+
+        :param domains: current domains (as bitmasks), pruned in place.
+        :param trail: as in `CSP::forwardChecking`.
+        :return: False when a domain was wiped out (backtrack required), True otherwise.
+        """
+        if self._pruner_table is None:
+            self._specialize()
+        pruner_table = self._pruner_table
+
+        queue = deque(var for var, domain in domains.items() if domain.bit_count() == 1)
+
+        while queue:
+            var = queue.popleft()
+            domain = domains[var]
+
+            # The domain may have shrunk further or been restored since queueing
+            if domain.bit_count() != 1:
+                continue
+            val = self._value_list[domain.bit_length() - 1]
+
+            for neighbour, compat_mask in pruner_table[var][val]:
+                neighbour_domain = domains.get(neighbour)
+                if neighbour_domain is None:
+                    continue
+
+                new_domain = neighbour_domain & compat_mask
+                if new_domain != neighbour_domain:
+                    domains[neighbour] = new_domain
+                    if trail is not None:
+                        trail.append((neighbour, neighbour_domain ^ new_domain))
+
+                    if new_domain == 0:
+                        return False
+                    if new_domain.bit_count() == 1:
+                        queue.append(neighbour)
+
+        return True
+
+    @staticmethod
+    def _undoTrail(domains: Dict[Variable, int], trail: List, mark: int) -> None:
+        """ Restores every domain removal logged on the trail past the given mark. """
+        while len(trail) > mark:
+            var, removed_mask = trail.pop()
+            domains[var] |= removed_mask
+
+    def selectVariable(self, assignment: Dict[Variable, Value], domains: Dict[Variable, int]) -> Variable:
+        """ Implement a strategy to select the next variable to assign. """
+        if not self.MRV:
+            # The domains dict holds exactly the unassigned variables
+            return random.choice(list(domains))
+
+        # MRV: the domains dict only holds unassigned variables, so a single
+        # min-scan over it finds the most constrained one
+        return min(domains, key=lambda current_var: domains[current_var].bit_count())
+
+    def orderDomain(self, assignment: Dict[Variable, Value], domains: Dict[Variable, int], var: Variable) -> \
+            Iterator[Value]:
+        """ Implement a smart ordering of the domain values.
+            Returns an iterator; under LCV the scored values sit in a min-heap and are
+            yielded on demand, so when the caller's first value succeeds the tail of
+            the ordering is never paid for. All reads of `domains` happen before this
+            method returns, so the caller is free to mutate it while iterating.
+        """
+        if not self.LCV:
+            return self._iterMask(domains[var])
+
+        # LCV: count directly how many neighbour values each candidate would prune,
+        # instead of simulating a full forwardChecking call per value
+        if self._pruner_table is None:
+            self._specialize()
+        var_pruners = self._pruner_table[var]
+
+        heap = []
+
+        for val in self._iterMask(domains[var]):
+            nr_pruned = 0
+            wipes_out_domain = False
+
+            for neighbour, compat_mask in var_pruners[val]:
+                neighbour_domain = domains.get(neighbour)
+                if neighbour_domain is None:
+                    continue
+                compatible = neighbour_domain & compat_mask
+
+                # LCV only works properly if no domain is wiped out
+                if compatible == 0:
+                    wipes_out_domain = True
+                    break
+
+                nr_pruned += (neighbour_domain ^ compatible).bit_count()
+
+            if not wipes_out_domain:
+                # The index keeps the heap comparisons on ints and the order stable
+                heap.append((nr_pruned, len(heap), val))
+
+        heapq.heapify(heap)
+
+        def popOrdered():
+            while heap:
+                yield heapq.heappop(heap)[2]
+
+        return popOrdered()
+
+    def solveAC3(self, initialAssignment: Dict[Variable, Value] = dict()) -> Optional[Dict[Variable, Value]]:
+        """ Called to solve this CSP with AC3.
+            Initializes domains and calls `CSP::_solveAC3`. """
+        initialAssignment = deepcopy(initialAssignment)
+        if not self.isValid(initialAssignment):
+            return None
+        domains = self.domainsFromAssignment(initialAssignment)
+        domains, nr_pruned = self.forwardChecking(initialAssignment, domains)
+        domains = self.ac3(initialAssignment, domains)
+        if domains is None:
+            return None
+        return self._solveAC3(initialAssignment, domains)
+
+    def _solveAC3(self, assignment: Dict[Variable, Value], domains: Dict[Variable, int]) -> Optional[
+        Dict[Variable, Value]]:
+        """
+            Implement the actual backtracking algorithm with AC3.
+            Iterative like `CSP::_solveForwardChecking`, sharing one domains dict whose
+            changes are undone through the trail; every assignment is propagated with
+            `CSP::forwardChecking` followed by `CSP::ac3` and `CSP::propagateSingletons`.
+            :return: a complete and valid assignment if one exists, None otherwise.
+        """
+
+        tick('_solveAC3')
+
+        if self.isComplete(assignment):
+            return assignment
+
+        trail = []
+
+        var = self.selectVariable(assignment, domains)
+        values = iter(self.orderDomain(assignment, domains, var))
+        stack = [(var, values, domains.pop(var), len(trail))]
+
+        while stack:
+            var, values, prev_domain, mark = stack[-1]
+
+            for value in values:
+                # Undo the pruning done for the previous value tried at this level
+                self._undoTrail(domains, trail, mark)
+
+                assignment[var] = value
+                self.forwardChecking(assignment, domains, var, trail=trail)
+
+                # A zero domain mask or a None from ac3 means a dead end
+                if all(domains.values()) and self.ac3(assignment, domains, var, trail=trail) is not None \
+                        and self.propagateSingletons(domains, trail=trail):
+                    tick('_solveAC3')
+
+                    if self.isComplete(assignment):
+                        return assignment
+
+                    next_var = self.selectVariable(assignment, domains)
+                    next_values = iter(self.orderDomain(assignment, domains, next_var))
+                    stack.append((next_var, next_values, domains.pop(next_var), len(trail)))
+                    break
+            else:
+                # Domain exhausted: undo this frame and backtrack
+                self._undoTrail(domains, trail, mark)
+                assignment.pop(var, None)
+                domains[var] = prev_domain
+                stack.pop()
+
+        return None
+
+    def ac3(self, assignment: Dict[Variable, Value], domains: Dict[Variable, int],
+            variable: Optional[Variable] = None,
+            trail: Optional[List] = None) -> Dict[Variable, int] or None:
+        """ Implement the AC3 algorithm from the theory lectures.
+
+        :param domains: current domains.
+        :param assignment: current assignment.
+        :param variable: If not None, the variable that was just assigned (only need to check changes).
+        :param trail: as in `CSP::forwardChecking`; when given, domains is revised in place
+            and every removal is logged for the caller to undo.
+        :return: the new domains ensuring arc consistency or none in case a domain was made empty (backtrack required)
+        """
+
+        if trail is None:
+            domains = copy(domains)
+
+        # The domains dict holds exactly the unassigned variables; no need to
+        # rebuild that set from the assignment
+        unassigned_variables = domains.keys()
+
+        queue = deque()
+        in_queue = set()
+
+        if variable is None:
+            # Seed with the arcs along actual constraint edges; arcs between
+            # unconstrained variables trivially pass and need not be queued
+            for var1 in unassigned_variables:
+                for var2 in self.neighbors(var1):
+                    if var2 in unassigned_variables:
+                        queue.append((var1, var2))
+                        in_queue.add((var1, var2))
+        else:
+            # Incremental call: forward checking only shrank the domains of the
+            # just-assigned variable's neighbours, so only arcs pointing at those
+            # can have lost support
+            for changed_var in self.neighbors(variable):
+                if changed_var not in unassigned_variables:
+                    continue
+                for neighbour in self.neighbors(changed_var):
+                    if neighbour in unassigned_variables and (neighbour, changed_var) not in in_queue:
+                        queue.append((neighbour, changed_var))
+                        in_queue.add((neighbour, changed_var))
+
+        while queue:
+            arc = queue.popleft()
+            in_queue.discard(arc)
+            tail_var, head_var = arc
+
+            if self.removeInconsistentValues(domains, tail_var, head_var, trail):
+
+                for neighbour in self.neighbors(tail_var):
+                    if neighbour not in domains:
+                        continue
+                    new_arc = (neighbour, tail_var)
+                    if new_arc not in in_queue:
+                        queue.append(new_arc)
+                        in_queue.add(new_arc)
+
+            if domains[tail_var] == 0:
+                return None
+
+        return domains
+
+    def removeInconsistentValues(self, domains: Dict[Variable, int], var1, var2,
+                                 trail: Optional[List] = None) -> bool:
+
+        domain_var1 = domains[var1]
+
+        # A value of var1 is supported iff it is compatible with some remaining
+        # value of var2, so the union of the compatibility masks of var2's values
+        # is exactly the supported part of var1's domain
+        support_mask = 0
+        for val_var2 in self._iterMask(domains[var2]):
+            support_mask |= self._compatMask(var2, val_var2, var1)
+
+            if domain_var1 & ~support_mask == 0:
+                break
+
+        new_domain_var1 = domain_var1 & support_mask
+
+        if new_domain_var1 != domain_var1:
+            domains[var1] = new_domain_var1
+            if trail is not None:
+                trail.append((var1, domain_var1 ^ new_domain_var1))
+            return True
+
+        return False
+
+def _solveBruteForceSeeded(args: (CSP, int, Dict[Variable, Value])) -> Optional[Dict[Variable, Value]]:
+    """ Worker for `CSP::solveBruteForceParallel`: reseeds the RNG so that each
+        worker breaks selection ties in a different order. """
+    csp, seed, initialAssignment = args
+    random.seed(seed)
+    return csp.solveBruteForce(initialAssignment)
@@ -14,7 +14,7 @@ class NQueens(CSP):
         """ Return the set of variables in this CSP. """
         return self._variables
 
-    def neighbors(self, var: 'Queen') -> Set['Queen']:
+    def _computeNeighbors(self, var: 'Queen') -> Set['Queen']:
         """ Return all variables related to var by some constraint. """
         return self.variables - {var}
 
@@ -1,117 +1,163 @@
-from math import ceil, floor
-
-from typing import Set, Dict
+from typing import Set, Dict, Tuple
 
 from CSP import CSP, Variable, Value
 
 class Sudoku(CSP):
+    # Every 9x9 board has the same cells, units and neighbour relation, so the
+    # structures are built once on first use and shared by all instances
+    _BOARD = None
+
     def __init__(self, MRV=True, LCV=True):
         super().__init__(MRV=MRV, LCV=LCV)
-
-        self._variables = set()
-
-        for row in range(0, 9):
-            for column in range(0, 9):
-                self._variables.add(Cell(row, column))
-
-        print('hi')
+        if Sudoku._BOARD is None:
+            Sudoku._BOARD = Sudoku._buildBoard()
+        self._variables, self._grid, self._neighbors, self._units = Sudoku._BOARD
+
+    @staticmethod
+    def _buildBoard():
+        """ Builds the shared board structures: the cells in row-major order, the
+            (row, column) -> cell grid, the neighbour relation and the 27 units
+            (9 rows, 9 columns, 9 squares) used by the hidden-single rule. """
+        # A tuple, not a set: iteration is over a contiguous array and the
+        # construction order (row-major) is stable
+        variables = tuple(Cell(row, column) for row in range(0, 9) for column in range(0, 9))
+        grid = {(cell.row, cell.column): cell for cell in variables}
+
+        # Group the cells by row, column and square once, so the neighbours of a
+        # cell are a single dict lookup instead of a scan over all 81 cells
+        by_row, by_column, by_square = dict(), dict(), dict()
+        for cell in variables:
+            by_row.setdefault(cell.row, set()).add(cell)
+            by_column.setdefault(cell.column, set()).add(cell)
+            by_square.setdefault(cell.squarePos, set()).add(cell)
+
+        neighbors = {
+            cell: frozenset(by_row[cell.row] | by_column[cell.column] | by_square[cell.squarePos]) - {cell}
+            for cell in variables
+        }
+        units = tuple(tuple(cells) for cells in (*by_row.values(), *by_column.values(), *by_square.values()))
+
+        return variables, grid, neighbors, units
 
     @property
-    def variables(self) -> Set['Cell']:
-        """ Return the set of variables in this CSP. """
+    def variables(self) -> Tuple['Cell', ...]:
+        """ Return the variables in this CSP. """
         return self._variables
 
     def getCell(self, x: int, y: int) -> 'Cell':
         """ Get the  variable corresponding to the cell on (x, y) """
-        for variable in self.variables:
-            if variable.row == y and variable.column == x:
-                return variable
-        raise AssertionError(f"Could not get cell at position ({x}, {y})")
-
-    def neighbors(self, var: 'Cell') -> Set['Cell']:
-        """ Return all variables related to var by some constraint. """
-
-        # All variables in the same cell, all variables in the same row and all variables in the same column
-        neighbours = set()
+        try:
+            return self._grid[(y, x)]
+        except KeyError:
+            raise AssertionError(f"Could not get cell at position ({x}, {y})")
+
+    def _computeNeighbors(self, var: 'Cell') -> Set['Cell']:
+        """ Return all variables related to var by some constraint:
+            the cells in the same row, the same column or the same square. """
+        return self._neighbors[var]
+
+    def propagateSingletons(self, domains, trail=None) -> bool:
+        """ Extends the generic singleton elimination with the Sudoku-specific
+            'hidden single' rule, interleaving the two until neither changes anything. """
+        while True:
+            if not super().propagateSingletons(domains, trail):
+                return False
+            if not self._hiddenSingles(domains, trail):
+                return True
+
+    def _hiddenSingles(self, domains, trail=None) -> bool:
+        """ Hidden single rule: if a candidate value occurs in only one unassigned cell
+            of a unit (row, column or square), that cell must take it, so its domain is
+            reduced to that value. Returns whether any domain changed.
+
+            Per unit the candidates seen once are found with two OR sweeps over the
+            cell masks: `seen_once & ~seen_more` are the bits set in exactly one cell. """
+        changed = False
+
+        for unit in self._units:
+            seen_once = 0
+            seen_more = 0
+            # Snapshot the unassigned cells with their masks so the second pass
+            # does not need to hit the domains dict again
+            unit_domains = []
+            for cell in unit:
+                domain = domains.get(cell)
+                if domain is None:
+                    continue
+                unit_domains.append((cell, domain))
+                seen_more |= seen_once & domain
+                seen_once |= domain
 
-        for current_var in self.variables:
-            if current_var == var:
+            unique = seen_once & ~seen_more
+            if not unique:
                 continue
 
-            if current_var.row == var.row:
-                neighbours.add(current_var)
-            elif current_var.column == var.column:
-                neighbours.add(current_var)
-            elif current_var.squarePos == var.squarePos:
-                neighbours.add(current_var)
+            for cell, domain in unit_domains:
+                unique_in_cell = domain & unique
+                if unique_in_cell and domain != unique_in_cell:
+                    domains[cell] = unique_in_cell
+                    if trail is not None:
+                        trail.append((cell, domain ^ unique_in_cell))
+                    changed = True
 
-        return neighbours
+        return changed
 
     def isValidPairwise(self, var1: 'Cell', val1: Value, var2: 'Cell', val2: Value) -> bool:
-        """ Return whether this pairwise assignment is valid with the constraints of the csp. """
-
-        if val1 == val2:
-            if var1.row == var2.row:
-                return False
-            elif var1.column == var2.column:
-                return False
-            elif var1.squarePos == var2.squarePos:
-                return False
-
-        return True
+        """ Return whether this pairwise assignment is valid with the constraints of the csp.
+            Two cells only conflict when they share a value and a row, column or square,
+            which is exactly the precomputed neighbour relation. """
+        return val1 != val2 or var2 not in self._neighbors[var1]
 
     def assignmentToStr(self, assignment: Dict['Cell', Value]) -> str:
         """ Formats the assignment of variables for this CSP into a string. """
-        s = ""
+        lines = []
         for y in range(9):
             if y != 0 and y % 3 == 0:
-                s += "---+---+---\n"
-            for x in range(9):
-                if x != 0 and x % 3 == 0:
-                    s += '|'
-
-                cell = self.getCell(x, y)
-                s += str(assignment.get(cell, ' '))
-            s += "\n"
-        return s
+                lines.append("---+---+---")
+            # self._variables is row-major, so row y is a contiguous slice
+            chars = [str(assignment.get(cell, ' ')) for cell in self._variables[9 * y:9 * y + 9]]
+            lines.append("|".join(("".join(chars[0:3]), "".join(chars[3:6]), "".join(chars[6:9]))))
+        return "\n".join(lines) + "\n"
 
     def parseAssignment(self, path: str) -> Dict['Cell', Value]:
         """ Gives an initial assignment for a Sudoku board from file. """
-        initialAssignment = dict()
+        with open(path, "rb") as file:
+            # One pass: strip all whitespace at C level, leaving the 81 cell digits
+            data = file.read().translate(None, b" \t\r\n\f\v")
 
-        with open(path, "r") as file:
-            for y, line in enumerate(file.readlines()):
-                if line.isspace():
-                    continue
-                assert y < 9, "Too many rows in sudoku"
+        assert len(data) == 81, "Expected 9 rows of 9 columns in sudoku"
 
-                for x, char in enumerate(line):
-                    if char.isspace():
-                        continue
+        initialAssignment = dict()
 
-                    assert x < 9, "Too many columns in sudoku"
+        for i, char in enumerate(data):
+            val = char - ord('0')
 
-                    var = self.getCell(x, y)
-                    val = int(char)
+            if val == 0:
+                continue
 
-                    if val == 0:
-                        continue
+            assert val > 0 and val < 10, f"Impossible value in grid"
+            initialAssignment[self._grid[(i // 9, i % 9)]] = val
 
-                    assert val > 0 and val < 10, f"Impossible value in grid"
-                    initialAssignment[var] = val
         return initialAssignment
 
 class Cell(Variable):
+    __slots__ = ('_row', '_column', '_square', '_hash')
+
+    # Shared by all cells; the solver core converts it to a 9-bit domain mask once
+    _START_DOMAIN = frozenset(range(1, 10))
+
     def __init__(self, row, column):
         super().__init__()
         self._row = row
         self._column = column
+        self._square = (row // 3, column // 3)
+        self._hash = hash((row, column))
 
     def __repr__(self):
         return f"C[{self.row}, {self.column}]"
 
     def __hash__(self):
-        return hash((self.row, self.column))
+        return self._hash
 
     def __eq__(self, other: 'Cell'):
         return self.row == other.row and self.column == other.column
@@ -129,9 +175,9 @@ class Cell(Variable):
         """
         Returns tuple (row, column) telling in which 3x3 square the cell is located
         """
-        return floor(self.row / 3.0), floor(self.column / 3.0)
+        return self._square
 
     @property
     def startDomain(self) -> Set[Value]:
         """ Returns the set of initial values of this variable (not taking constraints into account). """
-        return {val for val in range(1, 10)}
+        return Cell._START_DOMAIN
@@ -4,12 +4,16 @@ from tqdm import tqdm
 progressBars = dict()
 
 
+def tick(name):
+    """ Counts one call on the progress bar with the given name. """
+    if name not in progressBars:
+        progressBars[name] = tqdm(desc=name, unit=" calls")
+    progressBars[name].update(1)
+
+
 def monitor(f):
     """ Decorator to time functions and count the amount of calls. """
     def wrapper(*args, **kwargs):
-        if f not in progressBars:
-            progressBars[f] = tqdm(desc=f.__name__, unit=" calls")
-        progress = progressBars[f]
-        progress.update(1)
+        tick(f.__name__)
         return f(*args, **kwargs)
     return wrapper